@@ -14,13 +14,15 @@ def main(argv: Optional[List[str]] = None) -> int:
     p.add_argument("--bucket", required=True, help="GCS bucket name or gs://bucket for RAW candidates")
     p.add_argument("--project", required=True, help="GCP project ID")
     p.add_argument("--years", nargs="*", help="Optional list of years (e.g., 2016 2020 2024)")
+    p.add_argument("--states", nargs="*", help="Optional list of UFs to keep (default Amazon states)")
     args = p.parse_args(argv)
 
     # 1) Download TSE candidate data and upload to GCS
     return run_download_candidates(config=args.config,
                                    bucket=args.bucket,
                                    project=args.project,
-                                   years=args.years)
+                                   years=args.years,
+                                   states=args.states)
 
     # 2) Download TSE photos and upload to GCS
 
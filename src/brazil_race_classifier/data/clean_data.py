@@ -2,12 +2,29 @@
 import argparse, io, os, re, requests, yaml, zipfile
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import storage
-from typing import List, Optional
+from functools import partial
+from typing import Callable, List, Optional
 from unidecode import unidecode
 from tqdm import tqdm
 
 
+# Arrow-backed string dtype: pandas .str methods dispatch to pyarrow.compute kernels
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+# ASCII fold table for Latin-1 and neighbouring ranges (U+0080 to U+05FF), built once from unidecode
+_ASCII_FOLD = {ord(c): unidecode(c) for c in map(chr, range(0x80, 0x600))}
+
+# Characters outside the fold table range still need the full unidecode
+_OUTSIDE_FOLD = "[^\\x00-\u05ff]"
+
+# Schema dtypes that are cast straight from the raw column
+_NUMERIC_DTYPES = ("int", "int64", "integer", "float", "float64")
+
+
 # Normalize bucket name
 def normalize_bucket_name(bucket: str) -> str:
     """
@@ -18,63 +35,78 @@ def normalize_bucket_name(bucket: str) -> str:
 
 # Read candidate data
 def read_blob_parquet_as_df(client: storage.Client, bucket_name: str, blob_name: str) -> pd.DataFrame:
-    """Download a Parquet blob as bytes and read into pandas."""
+    """Stream a Parquet blob from GCS and read into pandas."""
     bucket = client.bucket(bucket_name)
     blob   = bucket.blob(blob_name)
-    data   = blob.download_as_bytes()
-    return pd.read_parquet(io.BytesIO(data), engine="pyarrow")
+    with blob.open("rb") as f:
+        return pd.read_parquet(f, engine="pyarrow")
 
 
-# Apply a series of transformations from YAML schema to a pandas Series
-def _apply_op(series: pd.Series, op: dict) -> pd.Series:
+# Map Arrow string types to the Arrow-backed pandas string dtype
+def _arrow_types_mapper(arrow_type: pa.DataType):
     """
-    Apply a single transform operation from YAML to a pandas Series.
-    Supported ops: lower, upper, strip, unidecode, cast(to=string|int)
+    Keep Arrow strings as Arrow-backed pandas strings instead of Python objects.
     """
-    name    = (op.get("op") or "").lower()
-    skip_na = bool(op.get("skip_na", False))
-
-    # choose NA-safe wrapper
-    def _maybe(fn):
-        if skip_na:
-            return series.map(lambda x: fn(x) if pd.notna(x) else x)
-        # pandas .str funcs already NA-safe; use them when possible
-        return series
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return STRING_DTYPE
+    return None
 
-    if name == "lower":
-        return _maybe(lambda x: str(x).lower()).str.lower()
-    if name == "upper":
-        return _maybe(lambda x: str(x).upper()).str.upper()
-    if name == "strip":
-        return _maybe(lambda x: str(x).strip()).str.strip()
-    if name == "unidecode":
-        return series.map(lambda x: unidecode(x) if pd.notna(x) else x)
 
-    if name == "cast":
-        to = (op.get("to") or "").lower()
-        if to in ("string", "str"):
-            # keep logical strings; preserve NA
-            return series.astype("string")
-        if to in ("int", "int64", "integer"):
-            # robust int casting with NA support
-            return pd.to_numeric(series, errors="coerce").astype("Int64")
-        if to in ("float", "float64"):
-            return pd.to_numeric(series, errors="coerce").astype("Float64")
-        # default: return unchanged if unknown cast
-        return series
+# Transliterate a pandas Series to ASCII
+def _vectorized_unidecode(series: pd.Series) -> pd.Series:
+    """
+    Apply unidecode via a cached str.translate table, falling back to the full
+    unidecode only for rows with codepoints outside the table range.
+    """
+    out  = series.str.translate(_ASCII_FOLD)
+    rest = out.str.contains(_OUTSIDE_FOLD, regex=True, na=False)
+    if rest.any():
+        out = out.copy()
+        out[rest] = out[rest].map(unidecode)
+    return out
 
-    # unknown op → no-op
-    return series
 
+# Column casts used by 'cast' ops (NA-safe)
+def _cast_string(series: pd.Series) -> pd.Series:
+    # keep logical strings; preserve NA
+    return series.astype(STRING_DTYPE)
 
-# Apply a series of transformations to a pandas Series
-def _apply_transforms(series: pd.Series, transforms: list | None) -> pd.Series:
-    if not transforms:
-        return series
-    out = series
-    for op in transforms:
-        out = _apply_op(out, op)
-    return out
+
+def _cast_int(series: pd.Series) -> pd.Series:
+    # robust int casting with NA support
+    return pd.to_numeric(series, errors="coerce").astype("Int64")
+
+
+def _cast_float(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce").astype("Float64")
+
+
+# Text ops run on Arrow-backed strings (pc.utf8_lower, pc.utf8_upper, pc.utf8_trim_whitespace)
+# and are NA-safe, so 'skip_na' needs no per-element handling
+_TEXT_OPS: dict[str, Callable[[pd.Series], pd.Series]] = {
+    "lower":     lambda s: s.str.lower(),
+    "upper":     lambda s: s.str.upper(),
+    "strip":     lambda s: s.str.strip(),
+    "unidecode": _vectorized_unidecode,
+}
+_CASTS: dict[str, Callable[[pd.Series], pd.Series]] = {
+    "string": _cast_string, "str": _cast_string,
+    "int": _cast_int, "int64": _cast_int, "integer": _cast_int,
+    "float": _cast_float, "float64": _cast_float,
+}
+
+
+# Turn a transform operation from YAML schema into a function on a pandas Series
+def _compile_op(op: dict) -> Callable[[pd.Series], pd.Series] | None:
+    """
+    Resolve a single transform operation from YAML to a Series -> Series function.
+    Supported ops: lower, upper, strip, unidecode, cast(to=string|int|float)
+    Unknown ops (and unknown casts) are no-ops and return None.
+    """
+    name = (op.get("op") or "").lower()
+    if name == "cast":
+        return _CASTS.get((op.get("to") or "").lower())
+    return _TEXT_OPS.get(name)
 
 
 # Enforce schema type
@@ -84,11 +116,11 @@ def _enforce_dtype(series: pd.Series, dtype: str | None) -> pd.Series:
     d = dtype.lower()
     try:
         if d in ("string", "str"):
-            return series.astype("string")
+            return series if series.dtype == STRING_DTYPE else series.astype(STRING_DTYPE)
         if d in ("int", "int64", "integer"):
-            return pd.to_numeric(series, errors="coerce").astype("Int64")
+            return series if series.dtype == "Int64" else pd.to_numeric(series, errors="coerce").astype("Int64")
         if d in ("float", "float64"):
-            return pd.to_numeric(series, errors="coerce").astype("Float64")
+            return series if series.dtype == "Float64" else pd.to_numeric(series, errors="coerce").astype("Float64")
         if d in ("bool", "boolean"):
             # simple heuristic: 'true'/'false' (case-insensitive)
             return series.map(lambda x: str(x).strip().lower() if pd.notna(x) else x)\
@@ -100,46 +132,65 @@ def _enforce_dtype(series: pd.Series, dtype: str | None) -> pd.Series:
     return series
 
 
+# Compile the cleaning schema into per-column lists of functions
+def _compile_schema(schema: dict) -> dict[str, list[Callable[[pd.Series], pd.Series]]]:
+    """
+    Resolve schema['columns'] once into {source column: [fn, ...]}, where the functions are
+    the string prelude (for non-numeric targets), the transforms in order and the dtype enforcement.
+    """
+    col_spec: dict = schema.get("columns", {})
+    if not col_spec:
+        raise ValueError("Schema has no 'columns' section.")
+
+    plan = {}
+    for src, spec in col_spec.items():
+        dtype = spec.get("dtype")
+        fns   = []
+
+        # prefer operating as Arrow-backed "string" for text ops, then cast at the end;
+        # numeric targets are cast directly, without the string round-trip
+        if (dtype or "").lower() not in _NUMERIC_DTYPES:
+            fns.append(lambda s: s if s.dtype == STRING_DTYPE else s.astype(STRING_DTYPE))
+
+        # transforms in order (unknown ops dropped)
+        fns.extend(fn for fn in map(_compile_op, spec.get("transforms") or []) if fn is not None)
+
+        # enforce dtype at the end
+        if dtype:
+            fns.append(partial(_enforce_dtype, dtype=dtype))
+
+        plan[src] = fns
+    return plan
+
+
 # Apply cleaning schema to a pandas DataFrame
-def clean_with_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+def clean_with_schema(df: pd.DataFrame, schema: dict, plan: dict | None = None) -> pd.DataFrame:
     """
     - Select & rename columns according to schema['columns'] mapping
     - Apply per-column transforms in order
     - Enforce target dtype
+    Pass a `plan` from _compile_schema(schema) to reuse it across calls.
     """
-    col_spec: dict = schema.get("columns", {})
-    if not col_spec:
-        raise ValueError("Schema has no 'columns' section.")
+    if plan is None:
+        plan = _compile_schema(schema)
+    col_spec: dict = schema["columns"]
 
     # Ensure all source columns exist (create empty if missing)
     missing = [src for src in col_spec.keys() if src not in df.columns]
     for src in missing:
-        df[src] = pd.Series([pd.NA] * len(df), dtype="string")
+        df[src] = pd.Series([pd.NA] * len(df), dtype=STRING_DTYPE, index=df.index)
 
     # Order/limit to schema keys
     src_cols_ordered = list(col_spec.keys())
-    df = df[src_cols_ordered].copy()
+    df = df[src_cols_ordered]
 
     # Per-column transforms & dtypes, then rename to target names
     cleaned = {}
     for src, spec in col_spec.items():
-        tgt = spec.get("target", src)
-        dtype = spec.get("dtype")
-        transforms = spec.get("transforms", [])
-
         s = df[src]
-
-        # prefer operating as "string" for text ops, then cast at the end
-        if s.dtype.name != "string":
-            s = s.astype("string")
-
-        # apply transforms in order
-        s = _apply_transforms(s, transforms)
-
-        # enforce dtype at the end
-        s = _enforce_dtype(s, dtype)
-
-        cleaned[tgt] = s
+        for fn in plan[src]:
+            s = fn(s)
+        cleaned[spec.get("target", src)] = s
 
     # Build final frame from cleaned columns in target order
     out_cols = [spec.get("target", src) for src, spec in col_spec.items()]
@@ -162,48 +213,47 @@ def list_page_prefixes(client: storage.Client, bucket_name: str, project: str |
 
 
 # Read TSE candidate data from bucket path
-def read_year_parquet(client: storage.Client, bucket_name: str, page_prefix: str, project: str | None = None) -> pd.DataFrame:
+def read_year_parquet(client: storage.Client, bucket_name: str, page_prefix: str, project: str | None = None,
+                      columns: list[str] | None = None) -> pd.DataFrame:
     """
     Read the Parquet for a given year prefix (e.g. '2024/') into a DataFrame.
     Tries the canonical name 'candidates_<year>.parquet', falls back to the first *.parquet under the prefix.
+    If `columns` is given, only those present in the file are read.
     """
-    # Link the bucket
-    bucket = client.bucket(bucket_name)
-    year   = page_prefix.strip("/")
+    # List the prefix once (no per-year exists() probe)
+    year  = page_prefix.strip("/")
+    blobs = [b for b in client.list_blobs(bucket_name, prefix=page_prefix) if b.name.lower().endswith(".parquet")]
+    if not blobs:
+        raise FileNotFoundError(f"No Parquet found under gs://{bucket_name}/{page_prefix}")
+
+    # Pick the canonical name, falling back to the first Parquet under the prefix
+    candidate_name = f"{page_prefix}candidates_{year}.parquet"
+    blob = next((b for b in blobs if b.name == candidate_name), blobs[0])
 
-    # Try the canonical name
-    candidate_name = f"{page_prefix}candidates_{year}.csv"
-    blob = bucket.blob(candidate_name)
-    if not blob.exists(client=client):
-        # Fallback: first CSV under the prefix
-        for b in client.list_blobs(bucket_name, prefix=page_prefix):
-            if b.name.lower().endswith(".parquet"):
-                blob = b
-                break
-        else:
-            raise FileNotFoundError(f"No Parquet found under gs://{bucket_name}/{page_prefix}")
+    # Stream data as an Arrow table (fetching only the requested columns)
+    with blob.open("rb") as f:
+        pf = pq.ParquetFile(f)
+        if columns is not None:
+            available = set(pf.schema_arrow.names)
+            columns   = [c for c in columns if c in available]
+        table = pf.read(columns=columns)
 
-    # Get data and return pandas DataFrame
-    data = blob.download_as_bytes()
-    return pd.read_parquet(io.BytesIO(data), engine="pyarrow")
+    # Convert to pandas only at the end, keeping strings Arrow-backed
+    return table.to_pandas(types_mapper=_arrow_types_mapper)
 
 
 # Upload candidates data to GCS bucket
-def upload_parquet_to_gcs(client: storage.Client, bucket_name: str, dest_path: str, df: pd.DataFrame) -> None:
+def upload_parquet_to_gcs(client: storage.Client, bucket_name: str, dest_path: str, table: pa.Table) -> None:
     """
-    Uploads a parquet file to a specified GCS bucket and path.
+    Uploads an Arrow table as a parquet file to a specified GCS bucket and path.
     """
     # Initiate GCS client and get the bucket
     bucket = client.bucket(bucket_name)
     blob   = bucket.blob(dest_path)
 
-    # Write DataFrame to a buffer in Parquet format
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, index=False, engine="pyarrow")
-    buffer.seek(0)
-
-    # Upload buffer to GCS
-    blob.upload_from_file(buffer, content_type="application/octet-stream")
+    # Stream table in Parquet format straight into the GCS upload
+    with blob.open("wb", content_type="application/octet-stream", ignore_flush=True) as f:
+        pq.write_table(table, f, compression="snappy", use_dictionary=True)
 
 
 # Main function to clean data and upload TSE candidate data to GCS
@@ -219,6 +269,7 @@ def main():
     ap.add_argument("--processed_bucket", help="GCS processed candidates bucket (default: read from project.yaml)")
     ap.add_argument("--output_name", default="candidates_clean", help="Output filename in processed bucket")
     ap.add_argument("--states", default="AC AM AP MA MT PA RO RR TO", help="List of states to include in clean data (default Amazon states)")
+    ap.add_argument("--workers", type=int, default=8, help="Number of year files to download concurrently")
     args = ap.parse_args()
     
     # Load cleaning schema
@@ -230,9 +281,12 @@ def main():
 
     # Get relevant variables
     encoding    = schema["meta"]["output"]["encoding"]
-    states      = [s.strip().upper() for s in args.states.split()]
+    states_set  = frozenset(s.strip().upper() for s in args.states.split())
     output_name = f"{args.output_name}.parquet"
 
+    # Compile the schema once for all years
+    plan = _compile_schema(schema)
+
     # Initiate GCS client
     client = storage.Client(project=args.project);
 
@@ -240,33 +294,38 @@ def main():
     bucket_name   = normalize_bucket_name(args.raw_bucket)
     page_prefixes = list_page_prefixes(client, bucket_name, project=args.project)
 
-    # Initiate list of dataframes to hold all years
-    df_list = []
+    # Initiate dictionary of Arrow tables to hold all years (keyed by page prefix)
+    tables = {}
+
+    # Download year files concurrently (GCS reads are I/O bound and release the GIL)
+    # and clean each one as soon as its download completes
+    max_workers = max(1, min(args.workers, len(page_prefixes)))
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(read_year_parquet, client, bucket_name, p, project=args.project, columns=list(keep_columns)): p
+                   for p in page_prefixes}
+        for fut in tqdm(as_completed(futures), total=len(futures), desc="Processing year files"):
+
+            # Clean according to schema
+            df = clean_with_schema(fut.result(), schema, plan=plan)
 
-    # Go through each page prefix (year) and read the CSV
-    for page_prefix in tqdm(page_prefixes, desc="Processing year files"):
+            # Filter by states (isin on a categorical hashes each category once, not each row)
+            df["state"] = df["state"].astype("category")
+            df = df.loc[df["state"].isin(states_set)].assign(state=lambda d: d["state"].cat.remove_unused_categories())
 
-        # Read and clean CSV according to schema
-        df = read_year_parquet(client, bucket_name, page_prefix, project=args.project)
-        df = clean_with_schema(df, schema)
-        
-        # Filter by states
-        df = df.query("state in @states")
-        
-        # Append to list of DataFrames
-        df_list.append(df)
+            # Store as Arrow (zero-copy for Arrow-backed columns) by page prefix to keep year order stable
+            tables[futures[fut]] = pa.Table.from_pandas(df, preserve_index=False)
 
-    # Concatenate all DataFrames into one
-    if not df_list:
+    # Concatenate all years into one table (chunks are appended, not copied)
+    if not tables:
         raise SystemExit("No data found to process. Check your raw bucket or schema.")
-    df = pd.concat(df_list, ignore_index=True)
+    combined = pa.concat_tables([tables[p] for p in page_prefixes], promote_options="default")
 
     # Upload to GCS processed bucket
     processed_bucket = normalize_bucket_name(args.processed_bucket)
-    upload_parquet_to_gcs(client, processed_bucket, output_name, df)
+    upload_parquet_to_gcs(client, processed_bucket, output_name, combined)
     
     # Save to data folder locally
-    df.to_parquet(f"./data/tse/{output_name}", index=False, engine="pyarrow")
+    pq.write_table(combined, f"./data/tse/{output_name}", compression="snappy", use_dictionary=True)
 
 # Run script directly
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Shared HTTP session for TSE downloads (connection pooling, keep-alive and retries across workers).
+# The pool fits upload_photos' default of 8 ZIPs read by 32 workers each.
+SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=256,
+                       max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)))
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
+# TSE downloads are ZIPs: ask for raw bytes so Content-Length and byte ranges refer to the file itself
+SESSION.headers["Accept-Encoding"] = "identity"
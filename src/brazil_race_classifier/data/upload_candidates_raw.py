@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
-import argparse, io, os, re, requests, yaml, zipfile
+import argparse, io, os, re, yaml, zipfile
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from brazil_race_classifier.data.http_session import SESSION
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import storage
 from typing import List, Optional
 from tqdm import tqdm
@@ -14,16 +18,55 @@ def normalize_bucket_name(bucket: str) -> str:
     return bucket.replace("gs://", "").strip("/")
 
 
+# Download a file with concurrent HTTP Range requests
+def _parallel_download(url: str, n: int=8, timeout: int=180) -> pa.BufferReader:
+    """
+    Download `url` as `n` byte ranges fetched concurrently and streamed into one preallocated buffer.
+    Falls back to a single GET if the server does not advertise byte ranges.
+    Returns a seekable file over the downloaded bytes (no extra copy).
+    """
+    # Check range support and size of the raw (unencoded) file
+    head = SESSION.head(url, allow_redirects=True, timeout=timeout)
+    size = int(head.headers.get("Content-Length", 0) or 0)
+    if not head.ok or head.headers.get("Accept-Ranges", "").lower() != "bytes" or size <= 0:
+        res = SESSION.get(url, timeout=timeout)
+        if res.status_code != 200:
+            raise Exception(f"Failed to download file from {url}. Status code: {res.status_code}")
+        return pa.BufferReader(res.content)
+
+    # Split into contiguous ranges and stream them concurrently into their slice of the buffer
+    n      = max(1, min(n, size))
+    chunks = [(i * size // n, (i + 1) * size // n - 1) for i in range(n)]
+    buf    = bytearray(size)
+
+    with memoryview(buf) as view:
+
+        def _fetch(start: int, end: int) -> None:
+            with SESSION.get(head.url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=timeout) as res:
+                if res.status_code != 206:
+                    raise Exception(f"Failed to download bytes {start}-{end} from {url}. Status code: {res.status_code}")
+                pos = start
+                for chunk in res.iter_content(chunk_size=1024 * 1024):
+                    if pos + len(chunk) > end + 1:
+                        raise Exception(f"Range response for bytes {start}-{end} from {url} is longer than requested.")
+                    view[pos:pos + len(chunk)] = chunk
+                    pos += len(chunk)
+                if pos != end + 1:
+                    raise Exception(f"Range response for bytes {start}-{end} from {url} is short ({pos - start} bytes).")
+
+        with ThreadPoolExecutor(max_workers=n) as ex:
+            for fut in [ex.submit(_fetch, start, end) for start, end in chunks]:
+                fut.result()
+
+    return pa.BufferReader(buf)
+
+
 # Download zip file from TSE url
 def read_tse_zip(url: str, target: str="BRASIL") -> pd.DataFrame:
     """
     Downloads a zip file from the TSE candidate URL and extracts the content for all Brazil candidate data.
     """
-    # Request the zip file and check for successful response
-    res = requests.get(url)
-    if res.status_code != 200:
-        raise Exception(f"Failed to download file from {url}. Status code: {res.status_code}")
-    
+
     # Extract file name structure from url and set target file name
     match = re.search(r"(consulta_cand_\d{4})", url)
     if not match:
@@ -31,8 +74,8 @@ def read_tse_zip(url: str, target: str="BRASIL") -> pd.DataFrame:
     file_structure = match.group(1)
     target_file    = f"{file_structure}_{target.upper()}.csv"
 
-    # Read target csv file from the zip archive
-    with zipfile.ZipFile(io.BytesIO(res.content)) as z:
+    # Request the zip file (in concurrent ranges when supported) and read target csv file from the archive
+    with _parallel_download(url) as content, zipfile.ZipFile(content) as z:
 
         # Check if target file exists in the zip list
         if target_file in z.namelist():
@@ -48,23 +91,21 @@ def read_tse_zip(url: str, target: str="BRASIL") -> pd.DataFrame:
 # Upload candidates data to GCS bucket
 def upload_parquet_to_gcs(client: storage.Client, bucket_name: str, dest_path: str, df: pd.DataFrame, project_id: str) -> None:
     """
-    Uploads a local CSV file to a specified GCS bucket and path.
+    Uploads a DataFrame as a parquet file to a specified GCS bucket and path.
     """
     # Get the bucket
     bucket = client.bucket(bucket_name)
     blob   = bucket.blob(dest_path)
 
-    # Write DataFrame to a buffer in Parquet format
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, index=False, engine="pyarrow")
-    buffer.seek(0)
-
-    # Upload buffer to GCS
-    blob.upload_from_file(buffer, content_type="application/octet-stream")
+    # Convert once to Arrow (no pandas metadata or index) and stream it straight into the GCS upload
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with blob.open("wb", content_type="application/octet-stream", ignore_flush=True) as f:
+        pq.write_table(table, f, compression="snappy", use_dictionary=True)
 
 
 # Function for CLI command to download TSE candidates and upload to GCS
-def run_download_candidates(*, config: str, bucket: str, project: str, years: list[str] | None = None) -> int:
+def run_download_candidates(*, config: str, bucket: str, project: str, years: list[str] | None = None,
+                            states: list[str] | None = None) -> int:
     """
     Same behavior as main(), but callable from code/CLI without argparse.
     Returns 0 on success, 1 if any year fails.
@@ -79,11 +120,11 @@ def run_download_candidates(*, config: str, bucket: str, project: str, years: li
     with open(config, "r", encoding="utf-8") as f:
         urls = yaml.safe_load(f) or {}
 
-    # Get relevant variables
-    states = [s.strip().upper() for s in args.states.split()]
+    # Get relevant variables (default Amazon states)
+    states_set = frozenset(s.strip().upper() for s in (states or "AC AM AP MA MT PA RO RR TO".split()))
 
     # Initiate GCS client
-    client = storage.Client(project=project_id)
+    client = storage.Client(project=project)
 
     # Get candidates URLs and keep only the specified years if provided
     candidates_urls = urls.get("candidates", {}) or {}
@@ -100,7 +141,7 @@ def run_download_candidates(*, config: str, bucket: str, project: str, years: li
     for year, url in tqdm(candidates_urls.items(), desc="Downloading candidates data"):
         try:
             df        = read_tse_zip(url)  # your existing helper
-            df        = df.query("SG_UF in @states")
+            df        = df.loc[df["SG_UF"].isin(states_set)]
             dest_path = f"{year}/candidates_{year}.parquet"
             upload_parquet_to_gcs(client, bucket_name, dest_path, df, project_id)
         except Exception as e:
@@ -131,10 +172,10 @@ def main():
         urls = yaml.safe_load(f)
 
     # Get relevant variables
-    states = [s.strip().upper() for s in args.states.split()]
+    states_set = frozenset(s.strip().upper() for s in args.states.split())
 
     # Initiate GCS client
-    client = storage.Client(project=project_id)
+    client = storage.Client(project=args.project)
 
     # Get candidates URLs and keep only the specified years if provided
     candidates_urls = urls.get("candidates", {})
@@ -150,7 +191,7 @@ def main():
         try:
             # Read the TSE zip file and extract the DataFrame and filter states
             df = read_tse_zip(url)
-            df = df.query("SG_UF in @states")
+            df = df.loc[df["SG_UF"].isin(states_set)]
 
             # Define the destination path in GCS
             dest_path = f"{year}/candidates_{year}.parquet"
@@ -2,14 +2,18 @@
 import argparse, io, os, re, requests, yaml, zipfile
 import numpy as np
 import pandas as pd
+from brazil_race_classifier.data.clean_data import _vectorized_unidecode
 from bs4 import BeautifulSoup
-from io import StringIO
 from google.cloud import storage
 from typing import List, Optional
 from unidecode import unidecode
 from tqdm import tqdm
 
 
+# Text inside parentheses (e.g. alternative spellings in ISA names)
+_PARENS = re.compile(r"\(([^)]*)\)")
+
+
 # Normalize bucket name
 def normalize_bucket_name(bucket: str) -> str:
     """
@@ -27,13 +31,42 @@ def upload_parquet_to_gcs(client: storage.Client, bucket_name: str, dest_path: s
     bucket = client.bucket(bucket_name)
     blob   = bucket.blob(dest_path)
 
-    # Write DataFrame to a buffer in Parquet format
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, index=False, engine="pyarrow")
-    buffer.seek(0)
+    # Stream DataFrame in Parquet format straight into the GCS upload
+    with blob.open("wb", content_type="application/octet-stream", ignore_flush=True) as f:
+        df.to_parquet(f, index=False, engine="pyarrow", compression="snappy", use_dictionary=True)
 
-    # Upload buffer to GCS
-    blob.upload_from_file(buffer, content_type="application/octet-stream")
+
+# Parse the ISA peoples table
+def parse_isa_table(html: str) -> tuple[list[str], list[str | None]]:
+    """
+    Extract the 'Nomes' and 'Outros nomes ou grafias' columns of the ISA peoples table,
+    keeping only numbered rows (empty alternative names become None).
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    # Cell text with whitespace collapsed (as pandas.read_html does)
+    def _text(cell) -> str:
+        return " ".join(cell.get_text().split())
+
+    # Locate the table by its header
+    for table in soup.find_all("table"):
+        rows   = table.find_all("tr")
+        header = [_text(c) for c in rows[0].find_all(["th", "td"])] if rows else []
+        if "Nomes" in header:
+            break
+    else:
+        raise Exception("Could not find the ISA peoples table (no 'Nomes' column).")
+    i_num, i_name, i_alt = header.index("#"), header.index("Nomes"), header.index("Outros nomes ou grafias")
+
+    # Build the two columns directly from numbered rows
+    names, alt = [], []
+    for tr in rows[1:]:
+        cells = tr.find_all(["td", "th"])
+        if len(cells) <= max(i_num, i_name, i_alt) or not _text(cells[i_num]).isdigit():
+            continue
+        names.append(_text(cells[i_name]))
+        alt.append(_text(cells[i_alt]) or None)
+    return names, alt
 
 
 # Main function to clean data and upload TSE candidate data to GCS
@@ -63,42 +96,23 @@ def main():
     encoding    = schema["meta"]["output"]["encoding"]
     output_name = f"{args.output_name}.parquet"
 
-    # Parse tables into a list of DataFrames and pick first table
-    tables = pd.read_html(StringIO(res.text))
-    df     = tables[0]
-    names  = []
-
-    # Keep only relevant columns and rename them
-    df = df[pd.to_numeric(df["#"], errors="coerce").notna()]
-    df = df[["Nomes", "Outros nomes ou grafias"]]
-
-    # Iterate over rows to clean names
-    for i in df.index:
-        name_raw = df.loc[i, "Nomes"]
-        name_str = str(name_raw).strip().lower()
-        name     = unidecode(name_str)
-
-        # Find all text inside parentheses
-        parens = re.findall(r"\((.*?)\)", name)
-        
-        # Append each parenthesis content (if any)
-        for p in parens:
-            names.append(p.strip())
-            
-        # Remove the parentheses (and their contents) from the original name
-        name = re.sub(r"\(.*?\)", "", name).strip()
-        names.append(name)
-
-        # Go over alternative names
-        if not pd.isna(df.loc[i, "Outros nomes ou grafias"]):
-            for j in str(df.loc[i, "Outros nomes ou grafias"]).split(","):
-                j = j.strip().lower()
-                j = unidecode(j)
-                if j:
-                    names.append(j)
+    # Parse the peoples table into name and alternative name lists
+    isa_names, isa_alt = parse_isa_table(res.text)
+
+    # Lowercase and transliterate names in one pass over the column
+    low = _vectorized_unidecode(pd.Series(isa_names, dtype="string").str.strip().str.lower())
+
+    # Split off parenthesis contents (if any) as extra names and remove them from the main name
+    paren_hits = low.str.extractall(_PARENS)[0].str.strip()
+    main_names = low.str.replace(_PARENS, "", regex=True).str.strip()
+
+    # Explode comma-separated alternative names, dropping empty entries
+    alt = _vectorized_unidecode(pd.Series(isa_alt, dtype="string").dropna().str.lower())
+    alt = alt.str.split(",").explode().str.strip()
+    alt = alt[alt != ""]
 
     # Remove duplicates and sort names
-    names = set(names)
+    names = pd.unique(pd.concat([paren_hits, main_names, alt], ignore_index=True).dropna())
 
     # Create a DataFrame and upload to GCS
     df_names = pd.DataFrame({"name": sorted(names)})
@@ -109,6 +123,7 @@ def main():
     upload_parquet_to_gcs(client, processed_bucket, output_name, df_names)
     
     # Save to data folder locally
+    df = pd.DataFrame({"Nomes": isa_names, "Outros nomes ou grafias": isa_alt})
     df.to_parquet(f"./data/tse/{output_name}", index=False, engine="pyarrow")
 
 # Run script directly
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
-import argparse, io, os, re, requests, tempfile, yaml, zipfile
+import argparse, google.auth, io, os, re, requests, tempfile, threading, yaml, zipfile
+from brazil_race_classifier.data.http_session import SESSION
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional
 from tqdm import tqdm
 
 
+# Members below this size are sent in a single request; larger ones use resumable uploads
+SMALL_UPLOAD_BYTES = 5_000_000
+UPLOAD_CHUNK_SIZE  = 8 * 1024 * 1024
+
+
 # Normalize bucket name
 def normalize_bucket_name(bucket: str) -> str:
     """
@@ -31,7 +42,7 @@ def download_zip_to_tempfile(url: str, timeout: int=180) -> str:
     """
     tmp = tempfile.NamedTemporaryFile(prefix="tse_zip_", suffix=".zip", delete=False)
     try:
-        with requests.get(url, stream=True, timeout=timeout) as r:
+        with SESSION.get(url, stream=True, timeout=timeout) as r:
             r.raise_for_status()
             for chunk in r.iter_content(chunk_size=1024 * 1024):
                 if chunk:
@@ -42,16 +53,211 @@ def download_zip_to_tempfile(url: str, timeout: int=180) -> str:
         tmp.close()
 
 
+# Seekable read-only file backed by HTTP Range requests
+class RangeRequestFile(io.RawIOBase):
+    """
+    File-like view of a remote file that fetches only the byte ranges being read,
+    keeping recently used pages in an LRU cache. Lets zipfile read the central
+    directory and individual members without downloading the whole archive.
+    """
+
+    def __init__(self, url: str, size: int, session: requests.Session=SESSION, page_size: int=1024 * 1024,
+                 max_pages: int=64, timeout: int=180):
+        super().__init__()
+        self.url       = url
+        self.size      = size
+        self.session   = session
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.timeout   = timeout
+        self._pos      = 0
+        self._pages: OrderedDict[int, bytes] = OrderedDict()
+        self._lock     = threading.Lock()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position: {pos}")
+        self._pos = pos
+        return pos
+
+    def _fetch_pages(self, first: int, last: int) -> dict[int, bytes]:
+        """
+        Fetch pages first..last (inclusive) with a single Range request and cache them.
+        """
+        start = first * self.page_size
+        end   = min(self.size, (last + 1) * self.page_size) - 1
+        res   = self.session.get(self.url, headers={"Range": f"bytes={start}-{end}"}, timeout=self.timeout)
+        res.raise_for_status()
+        if res.status_code != 206:
+            raise OSError(f"Server ignored Range request for {self.url} (status {res.status_code})")
+        data  = res.content
+        if len(data) != end - start + 1:
+            raise OSError(f"Short Range response for {self.url}: expected {end - start + 1} bytes, got {len(data)}")
+        pages = {p: data[(p - first) * self.page_size:(p - first + 1) * self.page_size] for p in range(first, last + 1)}
+
+        # Keep the most recent pages only
+        for p, chunk in pages.items():
+            self._pages[p] = chunk
+            self._pages.move_to_end(p)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return pages
+
+    def read(self, n: int=-1) -> bytes:
+        with self._lock:
+            if n is None or n < 0:
+                n = self.size - self._pos
+            n = min(n, self.size - self._pos)
+            if n <= 0:
+                return b""
+
+            # Collect the pages covering [pos, pos + n), fetching each run of missing pages in one request
+            first = self._pos // self.page_size
+            last  = (self._pos + n - 1) // self.page_size
+            pages = {}
+            p     = first
+            while p <= last:
+                if p in self._pages:
+                    self._pages.move_to_end(p)
+                    pages[p] = self._pages[p]
+                    p += 1
+                    continue
+                run_end = p
+                while run_end + 1 <= last and run_end + 1 not in self._pages:
+                    run_end += 1
+                pages.update(self._fetch_pages(p, run_end))
+                p = run_end + 1
+
+            # Slice the requested bytes out of the pages
+            data  = b"".join(pages[p] for p in range(first, last + 1))
+            start = self._pos - first * self.page_size
+            out   = data[start:start + n]
+            self._pos += len(out)
+            return out
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+# Open a remote ZIP for random access if the server supports Range requests
+def open_remote_zip(url: str, timeout: int=180) -> Optional[RangeRequestFile]:
+    """
+    Return a RangeRequestFile for `url` if the server advertises byte ranges, otherwise None.
+    """
+    head = SESSION.head(url, allow_redirects=True, timeout=timeout)
+    if not head.ok or head.headers.get("Accept-Ranges", "").lower() != "bytes" or "Content-Length" not in head.headers:
+        return None
+    return RangeRequestFile(head.url, int(head.headers["Content-Length"]), timeout=timeout)
+
+
+# Create a GCS client that can keep one connection per upload thread
+def make_storage_client(project: str, pool_size: int) -> storage.Client:
+    """
+    Build a storage.Client over our own AuthorizedSession whose connection pool holds `pool_size`
+    connections (the library's default session keeps 10). mTLS is configured the same way the
+    library does, so client certificates still take over https:// when enabled.
+    """
+    credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+    session.configure_mtls_channel()
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+
 # Upload files to GCS using streaming
 def upload_member_streaming(client: storage.Client, bucket_name: str, dest_path: str, zf: zipfile.ZipFile, info: zipfile.ZipInfo):
     """
-    Open a ZIP member and stream-upload it to GCS without loading into memory.
+    Upload a ZIP member to GCS: small photos in one request, larger ones stream-uploaded
+    in resumable chunks without loading into memory.
     """
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(dest_path)
+
+    # Small files: one read and a single upload request (no resumable session setup)
+    if info.file_size < SMALL_UPLOAD_BYTES:
+        blob.upload_from_string(zf.read(info), content_type="image/jpeg", retry=DEFAULT_RETRY)
+        return
+
     # ZipInfo.file_size gives the uncompressed size, which lets us avoid rewind().
+    blob.chunk_size = UPLOAD_CHUNK_SIZE
     with zf.open(info) as fp:
-        blob.upload_from_file(fp, size=info.file_size, content_type="image/jpeg", rewind=False)
+        blob.upload_from_file(fp, size=info.file_size, content_type="image/jpeg", rewind=False, retry=DEFAULT_RETRY)
+
+
+# Download and upload all photos for a single (year, UF) pair
+def process_year_uf(client: storage.Client, bucket_name: str, year: str, uf: str, url_tmpl: str, upload_workers: int=32) -> int:
+    """
+    Download the photo ZIP for one (year, UF) and upload its images concurrently; return the number uploaded.
+    """
+    url     = url_tmpl.format(UF=uf)
+    remote  = None
+    tmp_zip = None
+    try:
+        # 1) Read the ZIP remotely via Range requests; fall back to streaming it to a temp file
+        remote = open_remote_zip(url)
+        if remote is None:
+            tmp_zip = download_zip_to_tempfile(url)
+
+        # 2) Fan out member uploads across a worker pool. Each worker opens its own ZipFile over its own
+        #    file handle (a fresh RangeRequestFile or a reopened temp file), because a shared ZipFile holds
+        #    one lock across seek+read, which over Range requests would serialize every HTTP fetch of the
+        #    ZIP behind it. Members are sorted by offset and split into contiguous shards, so each worker
+        #    reads its part of the archive front to back and its small page cache serves neighbouring members.
+        def _open():
+            if remote is None:
+                return open(tmp_zip, "rb")
+            return RangeRequestFile(remote.url, remote.size, session=remote.session, page_size=remote.page_size,
+                                    max_pages=4, timeout=remote.timeout)
+
+        def _upload_shard(shard: List[zipfile.ZipInfo]) -> int:
+            with _open() as fh, zipfile.ZipFile(fh) as zf:
+                for info in shard:
+                    upload_member_streaming(client, bucket_name, f"{year}/{uf}/{clean_basename(info.filename)}", zf, info)
+            return len(shard)
+
+        with zipfile.ZipFile(remote if remote is not None else tmp_zip) as zf:
+            members = sorted((info for info in zf.infolist()
+                              if not info.is_dir() and info.filename.lower().endswith((".jpg", ".jpeg", ".png"))),
+                             key=lambda info: info.header_offset)
+
+        n_shards = min(upload_workers, len(members))
+        shards   = [members[i * len(members) // n_shards:(i + 1) * len(members) // n_shards] for i in range(n_shards)]
+
+        # Surface any upload error (progress is reported per ZIP by the outer bar in main)
+        uploaded = 0
+        with ThreadPoolExecutor(max_workers=max(n_shards, 1)) as pool:
+            for fut in as_completed([pool.submit(_upload_shard, shard) for shard in shards]):
+                uploaded += fut.result()
+
+        return uploaded
+
+    finally:
+        if remote is not None:
+            remote.close()
+        if tmp_zip and os.path.exists(tmp_zip):
+            try:
+                os.remove(tmp_zip)
+            except OSError:
+                pass
 
 
 # Main function to upload photos to GCS
@@ -66,6 +272,8 @@ def main():
     ap.add_argument("--years", nargs="*", help="Optional list of years to process (e.g., 2016 2020 2024)")
     ap.add_argument("--states", nargs="*", help="Optional list of UFs (e.g., AC AM SP)")
     ap.add_argument("--project", required=True, help="GCP project ID (overrides env/default)")
+    ap.add_argument("--workers", type=int, default=8, help="Number of (year, UF) ZIPs to process concurrently")
+    ap.add_argument("--upload_workers", type=int, default=32, help="Number of concurrent photo uploads per ZIP")
     args = ap.parse_args()
 
     # Load candidates URLs from the configuration file
@@ -95,39 +303,18 @@ def main():
     # Bucket and project
     bucket_name = normalize_bucket_name(args.bucket)
     project_id  = args.project
-    client      = storage.Client(project=project_id)
-
-    # Download and process each template by year
-    for year, url_tmpl in sorted(templates.items()):
-        for uf in states:
-            print(f"\nDownloading photos for state {uf} in year {year} ...")
-            url = url_tmpl.format(UF=uf)
-            tmp_zip = None
-            try:
-                # 1) Stream ZIP to a temp file
-                tmp_zip = download_zip_to_tempfile(url)
-
-                # 2) Iterate members and stream-upload JPGs
-                uploaded = 0
-                with zipfile.ZipFile(tmp_zip) as zf:
-                    for info in tqdm(zf.infolist()):
-                        if info.is_dir():
-                            continue
-                        if not info.filename.lower().endswith((".jpg", ".jpeg", ".png")):
-                            continue
-                        dest_name = clean_basename(info.filename)
-                        dest_path = f"{year}/{uf}/{dest_name}"
-                        upload_member_streaming(client, bucket_name, dest_path, zf, info)
-                        uploaded += 1
+    client      = make_storage_client(project_id, pool_size=args.workers * args.upload_workers)
 
+    # Download and process each (year, UF) ZIP concurrently, sharing one (thread-safe) GCS client
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        futures = {ex.submit(process_year_uf, client, bucket_name, year, uf, url_tmpl, args.upload_workers): (year, uf)
+                   for year, url_tmpl in sorted(templates.items()) for uf in states}
+        for fut in tqdm(as_completed(futures), total=len(futures), desc="Uploading photos"):
+            year, uf = futures[fut]
+            try:
+                fut.result()
             except Exception as e:
                 print(f"Error in year {year} state {uf}: {e}\n")
-            finally:
-                if tmp_zip and os.path.exists(tmp_zip):
-                    try:
-                        os.remove(tmp_zip)
-                    except OSError:
-                        pass 
 
 
 # Run script directly
@@ -3,6 +3,7 @@ import argparse, io, os, re, requests, torch, yaml, zipfile
 import numpy as np
 import pandas as pd
 from google.cloud import storage
+from numba import njit, prange
 from sentence_transformers import SentenceTransformer
 from sklearn.model_selection import train_test_split
 from typing import List, Optional
@@ -20,11 +21,53 @@ def normalize_bucket_name(bucket: str) -> str:
 
 # Read candidate data
 def read_blob_csv_as_df(client: storage.Client, bucket_name: str, blob_name: str, encoding: str="utf-8") -> pd.DataFrame:
-    """Download a CSV blob as bytes and read into pandas with dtype=str."""
+    """Stream a CSV blob from GCS and read into pandas with dtype=str."""
     bucket = client.bucket(bucket_name)
     blob   = bucket.blob(blob_name)
-    data   = blob.download_as_bytes()
-    return pd.read_csv(io.BytesIO(data), encoding=encoding, dtype=str, low_memory=False)
+    with blob.open("rb") as f:
+        return pd.read_csv(f, encoding=encoding, dtype=str, low_memory=False)
+
+
+# Encode names into embeddings in large batches
+def embed_names(model: SentenceTransformer, names: list[str], batch_size: int=512, device: str | None=None) -> np.ndarray:
+    """
+    Encode all names in one batched call (on GPU when available) and return unit-norm float32 embeddings.
+    """
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    emb = model.encode(names, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False,
+                       device=device, normalize_embeddings=True)
+    return np.ascontiguousarray(emb, dtype=np.float32)
+
+
+# Score embeddings against class prototypes
+@njit(parallel=True, fastmath=True)
+def _score(emb: np.ndarray, proto: np.ndarray, thresh: float) -> np.ndarray:
+    """
+    For each embedding row, return the index of the most similar prototype (dot product of
+    unit-norm vectors, i.e. cosine similarity), or -1 if the best similarity is below `thresh`.
+    """
+    n, d = emb.shape
+    k    = proto.shape[0]
+    out  = np.full(n, -1, dtype=np.int64)
+    if k == 0:
+        return out
+    for i in prange(n):
+        # Start from the first prototype (no -inf sentinel: fastmath assumes finite values)
+        best   = 0.0
+        for t in range(d):
+            best += emb[i, t] * proto[0, t]
+        best_j = 0
+        for j in range(1, k):
+            sim = 0.0
+            for t in range(d):
+                sim += emb[i, t] * proto[j, t]
+            if sim > best:
+                best   = sim
+                best_j = j
+        if best >= thresh:
+            out[i] = best_j
+    return out
 
 
 # Main function to train name classification models
@@ -38,6 +81,7 @@ def main():
     ap.add_argument("--processed-bucket", help="GCS processed candidates bucket (default: read from project.yaml)")
     ap.add_argument("--sentence-transformer", default="PORTULAN/serafim-100m-portuguese-pt-sentence-encoder", help="Name of the SentenceTransformer model to use")
     ap.add_argument("--output-name", default="indigenous_names.csv", help="Output filename in processed bucket")
+    ap.add_argument("--batch-size", type=int, default=512, help="Batch size for SentenceTransformer encoding")
     args = ap.parse_args()
 
     pass